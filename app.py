@@ -6,6 +6,7 @@ from functools import wraps
 from datetime import datetime, timezone
 import json
 from middleware import log_performance
+from payslip_writer import PayslipWriteBuffer, BufferFull, InvalidPayslip, prepare_payslip, dedupe_payslips
 
 # Configure logging
 logging.basicConfig(
@@ -49,6 +50,44 @@ def create_app(test_config=None):
         app.supabase = None
         logger.info("Running in test mode without Supabase")
     
+    def write_payslips(rows):
+        """Upsert payslips in one multi-row statement keyed on idempotency_key.
+
+        The first payslip for a key wins: rows whose key already exists (in the
+        database or earlier in the same batch) are left untouched, and the
+        stored payslip is returned with ``duplicate`` set to True.
+        """
+        rows = dedupe_payslips(rows)
+        if not app.supabase:
+            # For testing, simulate successful creation
+            return [dict(row, id=f"test-payslip-{row['idempotency_key']}", duplicate=False) for row in rows]
+        
+        response = app.supabase.from_('payslips').upsert(
+            rows, on_conflict='idempotency_key', ignore_duplicates=True
+        ).execute()
+        written = {row['idempotency_key']: dict(row, duplicate=False) for row in response.data}
+        missing = [row['idempotency_key'] for row in rows if row['idempotency_key'] not in written]
+        if missing:
+            existing = app.supabase.from_('payslips').select('*').in_('idempotency_key', missing).execute()
+            written.update({row['idempotency_key']: dict(row, duplicate=True) for row in existing.data})
+        return [written[row['idempotency_key']] for row in rows if row['idempotency_key'] in written]
+    
+    write_behind = app.config.get('PAYSLIP_WRITE_BEHIND', os.environ.get('PAYSLIP_WRITE_BEHIND', 'false'))
+    if str(write_behind).lower() in ('1', 'true', 'yes'):
+        try:
+            app.payslip_buffer = PayslipWriteBuffer(
+                write_payslips,
+                max_batch_size=int(app.config.get('PAYSLIP_BATCH_SIZE', os.environ.get('PAYSLIP_BATCH_SIZE', 50))),
+                max_delay=float(app.config.get('PAYSLIP_FLUSH_INTERVAL', os.environ.get('PAYSLIP_FLUSH_INTERVAL', 1.0))),
+                max_pending=int(app.config.get('PAYSLIP_MAX_PENDING', os.environ.get('PAYSLIP_MAX_PENDING', 5000)))
+            )
+        except ValueError as e:
+            logger.error(f"Invalid payslip write-behind settings: {str(e)}")
+            raise
+        logger.info("Payslip write-behind buffer enabled")
+    else:
+        app.payslip_buffer = None
+    
     def login_required(f):
         @wraps(f)
         def decorated_function(*args, **kwargs):
@@ -281,19 +320,75 @@ def create_app(test_config=None):
         if request.method == 'POST':
             try:
                 data = request.get_json()
-                data['date'] = datetime.now(timezone.utc).isoformat()
-                if app.supabase:
-                    response = app.supabase.from_('payslips').insert([data]).execute()
-                else:
-                    # For testing, simulate successful creation
-                    response = type('Response', (), {'data': [{'id': 'test-payslip-id'}]})()
+                if isinstance(data, dict):
+                    data.pop('date', None)
+                try:
+                    row = prepare_payslip(data, datetime.now(timezone.utc).isoformat())
+                except InvalidPayslip as e:
+                    logger.warning(f"Rejected payslip: {str(e)}")
+                    return jsonify({'error': str(e)}), 400
+                if app.payslip_buffer:
+                    try:
+                        queued = app.payslip_buffer.add(row)
+                    except BufferFull as e:
+                        logger.error(f"POST payslip error: {str(e)}")
+                        return jsonify({'error': str(e)}), 503
+                    status = 'queued' if queued else 'duplicate'
+                    logger.info(f"Payslip {status}: {row['idempotency_key']}")
+                    return jsonify({'status': status, 'idempotency_key': row['idempotency_key']}), 202
+                
+                rows = write_payslips([row])
+                if not rows:
+                    # Neither written nor readable, e.g. hidden by RLS or deleted concurrently
+                    logger.error(f"POST payslip error: {row['idempotency_key']} exists but could not be read back")
+                    return jsonify({
+                        'error': f"Payslip {row['idempotency_key']} already exists but could not be read back",
+                        'idempotency_key': row['idempotency_key']
+                    }), 409
                 
                 logger.info(f"Successfully created payslip: {data.get('employee_id')}")
-                return jsonify(response.data[0])
+                return jsonify(rows[0])
             except Exception as e:
                 logger.error(f"POST payslip error: {str(e)}")
                 return jsonify({'error': str(e)}), 500
     
+    @app.route('/api/payslips/batch', methods=['POST'])
+    @login_required
+    @log_performance()
+    def create_payslips_batch():
+        try:
+            data = request.get_json()
+            if not isinstance(data, list):
+                return jsonify({'error': 'Expected a list of payslips'}), 400
+            
+            now = datetime.now(timezone.utc).isoformat()
+            rows = []
+            for index, payslip in enumerate(data):
+                if isinstance(payslip, dict):
+                    payslip = dict(payslip)
+                    payslip.pop('date', None)
+                try:
+                    rows.append(prepare_payslip(payslip, now))
+                except InvalidPayslip as e:
+                    logger.warning(f"Rejected payslip batch at item {index}: {str(e)}")
+                    return jsonify({'error': f"Payslip {index}: {str(e)}"}), 400
+            written = write_payslips(rows)
+            returned = {payslip['idempotency_key'] for payslip in written}
+            missing = [key for key in dict.fromkeys(row['idempotency_key'] for row in rows) if key not in returned]
+            if missing:
+                logger.error(f"POST payslip batch error: {', '.join(missing)} exist but could not be read back")
+                return jsonify({
+                    'error': f"Payslips already exist but could not be read back: {', '.join(missing)}",
+                    'idempotency_keys': missing,
+                    'payslips': written
+                }), 409
+            
+            logger.info(f"Successfully created {len(written)} payslips in batch")
+            return jsonify(written)
+        except Exception as e:
+            logger.error(f"POST payslip batch error: {str(e)}")
+            return jsonify({'error': str(e)}), 500
+    
     @app.route('/health')
     @log_performance()
     def health_check():
@@ -69,9 +69,16 @@ create table if not exists payslips (
     deductions numeric,
     net_salary numeric,
     html text,
+    period text,
+    idempotency_key text,
     created_at timestamp with time zone default timezone('utc'::text, now())
 );
 
+-- Idempotency keys (employee_id:period); the columns are added here for existing deployments
+alter table payslips add column if not exists period text;
+alter table payslips add column if not exists idempotency_key text;
+create unique index if not exists payslips_idempotency_key_idx on payslips (idempotency_key);
+
 -- Enable Row Level Security (RLS)
 alter table payslips enable row level security;
 
@@ -0,0 +1,579 @@
+"""Local stand-in for the Supabase auth and PostgREST APIs used by the app.
+
+Tables mirror database.sql and live in memory. Every request can be delayed
+by a fixed latency plus random jitter, and a fraction of requests can be
+failed on purpose, so the app can be load tested without touching the hosted
+Supabase project.
+
+Run it standalone with:
+
+    python fake_supabase.py --port 54321 --latency 20 --jitter 10 --error-rate 0.01
+"""
+import argparse
+import base64
+import heapq
+import itertools
+import json
+import logging
+import random
+import threading
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from operator import itemgetter
+from time import sleep, time
+from urllib.parse import urlsplit, parse_qsl
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PASSWORD = 'password'
+
+def _now():
+    return datetime.now(timezone.utc).isoformat()
+
+def _uuid():
+    return str(uuid.uuid4())
+
+def make_token(payload):
+    """Build an unsigned JWT-shaped token; the client only checks its format"""
+    def encode(part):
+        return base64.urlsafe_b64encode(json.dumps(part).encode()).rstrip(b'=').decode()
+    return f"{encode({'alg': 'HS256', 'typ': 'JWT'})}.{encode(payload)}.fake-signature"
+
+ANON_KEY = make_token({'iss': 'supabase', 'ref': 'local', 'role': 'anon'})
+
+# Columns, defaults and unique columns for the tables in database.sql
+TABLES = {
+    'users': {
+        'columns': ['id', 'email', 'role', 'created_at'],
+        'unique': ['id', 'email'],
+        'defaults': {'created_at': _now},
+    },
+    'employees': {
+        'columns': ['id', 'name', 'position', 'basic_pay', 'allowance', 'gross_pay', 'napsa', 'paye',
+                    'net_pay', 'created_by', 'created_at', 'updated_at'],
+        'unique': ['id'],
+        'serial': 'id',
+        'defaults': {'created_at': _now, 'updated_at': _now},
+    },
+    'payslips': {
+        'columns': ['id', 'employee_id', 'date', 'basic_salary', 'allowances', 'deductions', 'net_salary',
+                    'html', 'period', 'idempotency_key', 'created_at'],
+        'unique': ['id', 'idempotency_key'],
+        'defaults': {'id': _uuid, 'date': _now, 'created_at': _now},
+    },
+}
+
+class PostgrestError(Exception):
+    def __init__(self, status, code, message):
+        super().__init__(message)
+        self.status = status
+        self.code = code
+        self.message = message
+
+    def to_json(self):
+        return {'code': self.code, 'message': self.message, 'details': None, 'hint': None}
+
+class FakeSupabase:
+    """In-memory state shared by all request handlers"""
+
+    def __init__(self, latency=0.0, jitter=0.0, error_rate=0.0, seed=None):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        # Rows are keyed by an internal row id and never mutated in place, so
+        # readers can work on them outside the lock; unique columns are indexed
+        # as {column: {str(value): row_id}} for O(1) conflict checks and lookups
+        self.tables = {name: {} for name in TABLES}
+        self.indexes = {name: {column: {} for column in spec['unique']} for name, spec in TABLES.items()}
+        self.row_ids = itertools.count(1)
+        self.serials = {name: 0 for name in TABLES}
+        self.accounts = {}
+        self.requests = 0
+        self.injected_errors = 0
+
+    def seed_data(self, employees=50):
+        """Create an admin, a viewer and a roster of employees"""
+        self.create_account('admin@riverdale.test', DEFAULT_PASSWORD, role='admin')
+        self.create_account('viewer@riverdale.test', DEFAULT_PASSWORD, role='viewer')
+        admin_id = self.accounts['admin@riverdale.test']['id']
+        for i in range(employees):
+            basic_pay = 3000 + (i % 10) * 500
+            self.insert('employees', [{
+                'name': f"Employee {i + 1}",
+                'position': 'Teacher',
+                'basic_pay': basic_pay,
+                'allowance': 500,
+                'gross_pay': basic_pay + 500,
+                'napsa': round((basic_pay + 500) * 0.05, 2),
+                'paye': 0,
+                'net_pay': round((basic_pay + 500) * 0.95, 2),
+                'created_by': admin_id,
+            }])
+
+    def create_account(self, email, password, role='viewer'):
+        user_id = _uuid()
+        with self.lock:
+            if email in self.accounts:
+                raise PostgrestError(422, 'user_already_exists', 'User already registered')
+            self.accounts[email] = {'id': user_id, 'password': password, 'created_at': _now()}
+        self.insert('users', [{'id': user_id, 'email': email, 'role': role}])
+        return self.accounts[email]
+
+    def delay(self):
+        """Sleep for the configured latency (ms) plus jitter; return True to inject an error"""
+        with self.lock:
+            self.requests += 1
+            wait = self.latency + self.random.uniform(-self.jitter, self.jitter)
+            fail = self.random.random() < self.error_rate
+            if fail:
+                self.injected_errors += 1
+        if wait > 0:
+            sleep(wait / 1000.0)
+        return fail
+
+    def _table(self, name):
+        if name not in TABLES:
+            raise PostgrestError(404, '42P01', f'relation "public.{name}" does not exist')
+        return self.tables[name]
+
+    def check_columns(self, name, columns):
+        """Reject columns that are not in database.sql, like PostgREST's schema cache"""
+        self._table(name)
+        for column in columns:
+            if column not in TABLES[name]['columns']:
+                raise PostgrestError(400, 'PGRST204', f"Could not find the '{column}' column of '{name}' in the schema cache")
+
+    def _find_conflict(self, name, row, columns, ignore=None):
+        """Return (row_id, column) of a stored row sharing a unique value with ``row``"""
+        for column in columns:
+            value = row.get(column)
+            if value is None or column not in self.indexes[name]:
+                continue
+            row_id = self.indexes[name][column].get(str(value))
+            if row_id is not None and row_id != ignore:
+                return row_id, column
+        return None, None
+
+    def _store(self, name, row_id, row):
+        """Insert or replace a row and keep the unique indexes in step"""
+        old = self.tables[name].get(row_id)
+        for column, index in self.indexes[name].items():
+            if old is not None and old.get(column) is not None:
+                index.pop(str(old[column]), None)
+            if row.get(column) is not None:
+                index[str(row[column])] = row_id
+        self.tables[name][row_id] = row
+
+    def _remove(self, name, row_id):
+        row = self.tables[name].pop(row_id)
+        for column, index in self.indexes[name].items():
+            if row.get(column) is not None:
+                index.pop(str(row[column]), None)
+
+    def _candidates(self, name, filters):
+        """Snapshot the (row_id, row) pairs that could match, using a unique index when a filter allows it.
+
+        Must be called with the lock held; only references are copied.
+        """
+        table = self._table(name)
+        for column, operator, value in filters:
+            index = self.indexes[name].get(column)
+            if index is None or operator not in ('eq', 'in'):
+                continue
+            values = value if operator == 'in' else [value]
+            row_ids = [index[v] for v in values if v in index]
+            return [(row_id, table[row_id]) for row_id in dict.fromkeys(row_ids)]
+        return list(table.items())
+
+    def count(self, name, filters=()):
+        with self.lock:
+            if not filters:
+                return len(self._table(name))
+            candidates = self._candidates(name, filters)
+        return sum(1 for _, row in candidates if _matches(row, filters))
+
+    def select(self, name, filters=(), order=None, limit=None, offset=0):
+        with self.lock:
+            candidates = self._candidates(name, filters)
+        # Filtering, sorting and copying happen outside the lock
+        rows = [row for _, row in candidates if _matches(row, filters)] if filters else [row for _, row in candidates]
+        total = len(rows)
+        order = order or []
+        if len(order) == 1 and limit is not None:
+            # Top-k for the common "order by one column, limit n" query
+            column, descending = order[0]
+            pick = heapq.nlargest if descending else heapq.nsmallest
+            try:
+                rows = pick(offset + limit, rows, key=itemgetter(column))
+            except (KeyError, TypeError):
+                # Missing or NULL values in the column; use the NULL-aware ordering
+                rows = pick(offset + limit, rows, key=lambda row: _sort_key(row, column))
+        else:
+            for column, descending in reversed(order):
+                rows.sort(key=lambda row: _sort_key(row, column), reverse=descending)
+        rows = rows[offset:]
+        if limit is not None:
+            rows = rows[:limit]
+        return [dict(row) for row in rows], total
+
+    def insert(self, name, rows, resolution=None, on_conflict=None):
+        spec = TABLES.get(name, {})
+        for row in rows:
+            self.check_columns(name, row)
+        created = []
+        with self.lock:
+            table = self._table(name)
+            for row in rows:
+                row = dict(row)
+                for column, default in spec.get('defaults', {}).items():
+                    if row.get(column) is None:
+                        row[column] = default()
+                serial = spec.get('serial')
+                if serial and row.get(serial) is None:
+                    self.serials[name] += 1
+                    row[serial] = self.serials[name]
+                columns = [on_conflict] if on_conflict else spec.get('unique', [])
+                row_id, column = self._find_conflict(name, row, columns)
+                if row_id is not None:
+                    if resolution == 'ignore-duplicates':
+                        continue
+                    if resolution == 'merge-duplicates':
+                        merged = dict(table[row_id])
+                        merged.update({k: v for k, v in row.items() if k not in spec.get('unique', [])})
+                        self._store(name, row_id, merged)
+                        created.append(dict(merged))
+                        continue
+                    raise PostgrestError(
+                        409, '23505',
+                        f'duplicate key value violates unique constraint "{name}_{column}_key"'
+                    )
+                self._store(name, next(self.row_ids), row)
+                created.append(dict(row))
+        return created
+
+    def update(self, name, values, filters):
+        self.check_columns(name, values)
+        updated = []
+        with self.lock:
+            for row_id, row in self._candidates(name, filters):
+                if not _matches(row, filters):
+                    continue
+                row = dict(row, **values)
+                _, column = self._find_conflict(name, row, list(values), ignore=row_id)
+                if column:
+                    raise PostgrestError(
+                        409, '23505',
+                        f'duplicate key value violates unique constraint "{name}_{column}_key"'
+                    )
+                self._store(name, row_id, row)
+                updated.append(dict(row))
+        return updated
+
+    def delete(self, name, filters):
+        deleted = []
+        with self.lock:
+            for row_id, row in self._candidates(name, filters):
+                if _matches(row, filters):
+                    self._remove(name, row_id)
+                    deleted.append(dict(row))
+        return deleted
+
+    def account_for_token(self, token):
+        """Find the email of the account a bearer token was issued to"""
+        try:
+            payload = token.split('.')[1]
+            claims = json.loads(base64.urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))
+        except (IndexError, ValueError):
+            return None
+        email = claims.get('email')
+        return email if email in self.accounts else None
+
+    def session_for(self, email):
+        account = self.accounts[email]
+        user = {
+            'id': account['id'],
+            'aud': 'authenticated',
+            'role': 'authenticated',
+            'email': email,
+            'app_metadata': {'provider': 'email'},
+            'user_metadata': {},
+            'created_at': account['created_at'],
+        }
+        expires_in = 3600
+        return {
+            'access_token': make_token({'sub': account['id'], 'email': email, 'role': 'authenticated',
+                                        'exp': int(time()) + expires_in}),
+            'token_type': 'bearer',
+            'expires_in': expires_in,
+            'expires_at': int(time()) + expires_in,
+            'refresh_token': _uuid(),
+            'user': user,
+        }
+
+OPERATORS = {'eq', 'neq', 'gt', 'gte', 'lt', 'lte', 'in', 'is'}
+
+def _parse_value(value):
+    if len(value) >= 2 and value[0] == value[-1] == '"':
+        return value[1:-1]
+    return value
+
+def _parse_list(value):
+    # PostgREST list syntax: (a,"b,c",d)
+    items, current, quoted = [], '', False
+    for char in value.strip('()'):
+        if char == '"':
+            quoted = not quoted
+        elif char == ',' and not quoted:
+            items.append(current)
+            current = ''
+        else:
+            current += char
+    if current or items:
+        items.append(current)
+    return items
+
+def _sort_key(row, column):
+    # NULLs sort after values, so they come last ascending and first descending like PostgreSQL
+    value = row.get(column)
+    return (value is None, '' if value is None else value)
+
+def _compare(actual, expected):
+    try:
+        return float(actual), float(expected)
+    except (TypeError, ValueError):
+        return str(actual), str(expected)
+
+def _matches(row, filters):
+    for column, operator, value in filters:
+        if operator not in OPERATORS:
+            raise PostgrestError(400, 'PGRST100', f"'{operator}' filters are not supported by the fake server")
+        actual = row.get(column)
+        if operator == 'in':
+            if actual is None or str(actual) not in value:
+                return False
+        elif operator == 'is':
+            if value == 'null' and actual is not None:
+                return False
+            if value in ('true', 'false') and actual is not (value == 'true'):
+                return False
+        elif actual is None:
+            return False
+        else:
+            left, right = _compare(actual, value)
+            if operator == 'eq' and left != right:
+                return False
+            if operator == 'neq' and left == right:
+                return False
+            if operator == 'gt' and not left > right:
+                return False
+            if operator == 'gte' and not left >= right:
+                return False
+            if operator == 'lt' and not left < right:
+                return False
+            if operator == 'lte' and not left <= right:
+                return False
+    return True
+
+RESERVED_PARAMS = {'select', 'order', 'limit', 'offset', 'on_conflict', 'columns'}
+
+def parse_query(query):
+    """Split a PostgREST query string into filters and modifiers"""
+    params = parse_qsl(query, keep_blank_values=True)
+    filters, options = [], {}
+    for key, value in params:
+        if key in RESERVED_PARAMS:
+            options[key] = value
+            continue
+        operator, _, operand = value.partition('.')
+        if operator not in OPERATORS:
+            raise PostgrestError(400, 'PGRST100', f"'{operator}' filters are not supported by the fake server")
+        if operator == 'in':
+            filters.append((key, 'in', [_parse_value(item) for item in _parse_list(operand)]))
+        else:
+            filters.append((key, operator, _parse_value(operand)))
+    order = []
+    for part in filter(None, options.get('order', '').split(',')):
+        column, *modifiers = part.split('.')
+        order.append((column, 'desc' in modifiers))
+    options['order'] = order
+    return filters, options
+
+def _project(rows, select):
+    columns = [column.strip() for column in (select or '*').split(',')]
+    if '*' in columns:
+        return rows
+    return [{column: row.get(column) for column in columns} for row in rows]
+
+class FakeSupabaseHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    state = None
+
+    def log_message(self, format, *args):
+        logger.debug(format % args)
+
+    def _send(self, status, body=None, headers=None):
+        payload = b'' if body is None else json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(payload)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(payload)
+
+    def _body(self):
+        length = int(self.headers.get('Content-Length') or 0)
+        if not length:
+            return None
+        return json.loads(self.rfile.read(length))
+
+    def _prefer(self):
+        prefer = {}
+        for item in (self.headers.get('Prefer') or '').split(','):
+            key, _, value = item.strip().partition('=')
+            if key:
+                prefer[key] = value
+        return prefer
+
+    def _dispatch(self):
+        url = urlsplit(self.path)
+        body = self._body()
+        if self.state.delay():
+            self._send(503, {'code': 'PGRST000', 'message': 'Injected failure', 'details': None, 'hint': None})
+            return
+        try:
+            if url.path.startswith('/auth/v1/'):
+                self._handle_auth(url.path[len('/auth/v1/'):], dict(parse_qsl(url.query)), body)
+            elif url.path.startswith('/rest/v1/'):
+                self._handle_rest(url.path[len('/rest/v1/'):], url.query, body)
+            else:
+                self._send(404, {'message': f"Unknown path {url.path}"})
+        except PostgrestError as e:
+            self._send(e.status, e.to_json())
+
+    do_GET = do_HEAD = do_POST = do_PATCH = do_PUT = do_DELETE = _dispatch
+
+    def _handle_auth(self, path, query, body):
+        body = body or {}
+        if path == 'token' and query.get('grant_type') == 'password':
+            account = self.state.accounts.get(body.get('email'))
+            if not account or account['password'] != body.get('password'):
+                self._send(400, {'error': 'invalid_grant', 'error_description': 'Invalid login credentials'})
+                return
+            self._send(200, self.state.session_for(body['email']))
+        elif path == 'signup':
+            self.state.create_account(body.get('email'), body.get('password'))
+            self._send(200, self.state.session_for(body['email']))
+        elif path == 'recover':
+            self._send(200, {})
+        elif path == 'logout':
+            self._send(204)
+        elif path == 'user':
+            authorization = self.headers.get('Authorization') or ''
+            email = self.state.account_for_token(authorization.partition(' ')[2])
+            if not email:
+                self._send(401, {'msg': 'Invalid JWT'})
+                return
+            if self.command == 'PUT' and body.get('password'):
+                self.state.accounts[email]['password'] = body['password']
+            self._send(200, self.state.session_for(email)['user'])
+        else:
+            self._send(404, {'msg': f"Unknown auth endpoint {path}"})
+
+    def _handle_rest(self, table, query, body):
+        filters, options = parse_query(query)
+        prefer = self._prefer()
+        self._check_query_columns(table, filters, options)
+        if self.command in ('GET', 'HEAD'):
+            limit = int(options['limit']) if 'limit' in options else None
+            offset = int(options.get('offset', 0))
+            if options.get('select') == 'count':
+                # Aggregate only: count without copying or sorting any rows
+                total = self.state.count(table, filters)
+                data = rows = [{'count': total}]
+            else:
+                rows, total = self.state.select(table, filters, options['order'], limit, offset)
+                data = _project(rows, options.get('select'))
+            headers = {}
+            if 'count' in prefer:
+                headers['Content-Range'] = f"{offset}-{offset + len(rows) - 1}/{total}" if rows else f"*/{total}"
+            if 'vnd.pgrst.object' in (self.headers.get('Accept') or ''):
+                if len(data) != 1:
+                    raise PostgrestError(406, 'PGRST116', 'JSON object requested, multiple (or no) rows returned')
+                data = data[0]
+            self._send(200, data, headers)
+            return
+        if self.command == 'POST':
+            rows = body if isinstance(body, list) else [body or {}]
+            resolution = prefer.get('resolution')
+            data = self.state.insert(table, rows, resolution, options.get('on_conflict') if resolution else None)
+            status = 201
+        elif self.command == 'PATCH':
+            data = self.state.update(table, body or {}, filters)
+            status = 200
+        elif self.command == 'DELETE':
+            data = self.state.delete(table, filters)
+            status = 200
+        else:
+            raise PostgrestError(405, 'PGRST105', f"Method {self.command} not allowed")
+        if prefer.get('return') == 'representation':
+            self._send(status, _project(data, options.get('select')))
+        else:
+            self._send(204 if status == 200 else status)
+
+    def _check_query_columns(self, table, filters, options):
+        self.state._table(table)
+        columns = [column for column, _, _ in filters] + [column for column, _ in options['order']]
+        select = options.get('select') or '*'
+        if select != 'count':
+            columns += [column.strip() for column in select.split(',') if column.strip() != '*']
+        for column in columns:
+            if column not in TABLES[table]['columns']:
+                raise PostgrestError(400, '42703', f"column {table}.{column} does not exist")
+
+def create_server(host='127.0.0.1', port=0, latency=0.0, jitter=0.0, error_rate=0.0,
+                  employees=50, seed=None):
+    """Build a seeded fake Supabase server; port 0 picks a free port"""
+    state = FakeSupabase(latency=latency, jitter=jitter, error_rate=error_rate, seed=seed)
+    state.seed_data(employees=employees)
+    handler = type('BoundFakeSupabaseHandler', (FakeSupabaseHandler,), {'state': state})
+    server = ThreadingHTTPServer((host, port), handler)
+    server.daemon_threads = True
+    server.state = state
+    server.url = f"http://{host}:{server.server_address[1]}"
+    return server
+
+def serve_in_thread(server):
+    thread = threading.Thread(target=server.serve_forever, name='fake-supabase', daemon=True)
+    thread.start()
+    return thread
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a local fake Supabase/PostgREST server')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=54321)
+    parser.add_argument('--latency', type=float, default=0.0, help='Base latency per request in ms')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Random +/- latency in ms')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fraction of requests failed with 503')
+    parser.add_argument('--employees', type=int, default=50, help='Number of employees to seed')
+    parser.add_argument('--seed', type=int, default=None, help='Random seed for jitter and errors')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    server = create_server(args.host, args.port, args.latency, args.jitter, args.error_rate,
+                           args.employees, args.seed)
+    print(f"Fake Supabase running at {server.url}")
+    print(f"SUPABASE_URL={server.url}")
+    print(f"SUPABASE_KEY={ANON_KEY}")
+    print(f"Accounts: admin@riverdale.test / viewer@riverdale.test (password: {DEFAULT_PASSWORD})")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nServer stopped.")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,403 @@
+"""Concurrent load and soak driver for the payroll app.
+
+Starts the fake Supabase server from fake_supabase.py, runs the app under
+gunicorn against it, replays a weighted mix of user journeys and reports
+throughput, p50/p95/p99 latency and error rate per operation.
+
+Example, comparing gunicorn settings with 30ms of simulated database latency:
+
+    python load_test.py --workers 2 --threads 4 --concurrency 20 --duration 60 --latency 30 --jitter 10
+    python load_test.py --workers 4 --threads 8 --concurrency 20 --duration 60 --latency 30 --jitter 10
+
+Pass --target to drive an app that is already running instead.
+"""
+import argparse
+import itertools
+import json
+import logging
+import math
+import os
+import random
+import socket
+import subprocess
+import sys
+import threading
+from collections import defaultdict
+from http.cookiejar import CookieJar
+from time import monotonic, sleep
+from urllib.error import HTTPError, URLError
+from urllib.request import Request, build_opener, HTTPCookieProcessor, HTTPRedirectHandler
+
+from fake_supabase import ANON_KEY, DEFAULT_PASSWORD, create_server, serve_in_thread
+
+logger = logging.getLogger(__name__)
+
+ADMIN_EMAIL = 'admin@riverdale.test'
+DEFAULT_MIX = 'login=1,employees=6,payslip_burst=1,metrics=2'
+
+def parse_mix(mix):
+    """Parse 'name=weight,...' into a dict of scenario weights"""
+    weights = {}
+    for item in filter(None, mix.split(',')):
+        name, _, weight = item.partition('=')
+        name = name.strip()
+        if name not in SCENARIOS:
+            raise ValueError(f"Unknown scenario '{name}', expected one of {', '.join(SCENARIOS)}")
+        weights[name] = float(weight or 1)
+    if not weights:
+        raise ValueError('Scenario mix is empty')
+    return weights
+
+class LatencyStats:
+    """Request and error counts plus a fixed-resolution latency histogram.
+
+    Latencies fall into logarithmic buckets 1% wide, so memory stays bounded
+    however long a soak run lasts and percentiles are accurate to within 1%.
+    """
+
+    MIN_LATENCY = 0.0001
+    GROWTH = 1.01
+
+    def __init__(self):
+        self.requests = 0
+        self.errors = 0
+        self.buckets = defaultdict(int)
+
+    def add(self, latency, ok):
+        self.requests += 1
+        if not ok:
+            self.errors += 1
+        bucket = int(math.log(max(latency, self.MIN_LATENCY) / self.MIN_LATENCY, self.GROWTH))
+        self.buckets[bucket] += 1
+
+    def merge(self, other):
+        self.requests += other.requests
+        self.errors += other.errors
+        for bucket, count in other.buckets.items():
+            self.buckets[bucket] += count
+        return self
+
+    def percentile(self, pct):
+        """Nearest-rank percentile in seconds, reported as the upper edge of its bucket"""
+        if not self.requests:
+            return 0.0
+        rank = max(1, math.ceil(pct / 100.0 * self.requests))
+        seen = 0
+        for bucket in sorted(self.buckets):
+            seen += self.buckets[bucket]
+            if seen >= rank:
+                return self.MIN_LATENCY * self.GROWTH ** (bucket + 1)
+        return 0.0
+
+    def to_dict(self, elapsed):
+        return {
+            'requests': self.requests,
+            'throughput': self.requests / elapsed if elapsed else 0.0,
+            'p50_ms': self.percentile(50) * 1000,
+            'p95_ms': self.percentile(95) * 1000,
+            'p99_ms': self.percentile(99) * 1000,
+            'error_rate': self.errors / self.requests if self.requests else 0.0,
+        }
+
+class Recorder:
+    """Thread-safe per-operation latency stats for the whole run and the current interval"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.totals = defaultdict(LatencyStats)
+        self.window = defaultdict(LatencyStats)
+
+    def record(self, operation, latency, ok):
+        with self.lock:
+            self.totals[operation].add(latency, ok)
+            self.window[operation].add(latency, ok)
+
+    def take_window(self):
+        """Return the stats recorded since the last call and start a new interval"""
+        with self.lock:
+            window, self.window = self.window, defaultdict(LatencyStats)
+        return window
+
+    def snapshot(self):
+        with self.lock:
+            return {operation: LatencyStats().merge(stats) for operation, stats in self.totals.items()}
+
+def summarize(stats_by_operation, elapsed):
+    """Aggregate per-operation stats into overall and per-operation statistics"""
+    overall = LatencyStats()
+    for stats in stats_by_operation.values():
+        overall.merge(stats)
+    return {
+        'elapsed': elapsed,
+        'overall': overall.to_dict(elapsed),
+        'operations': {name: stats.to_dict(elapsed) for name, stats in sorted(stats_by_operation.items())},
+    }
+
+def format_report(summary):
+    lines = [
+        f"{'operation':<16}{'requests':>10}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>9}",
+    ]
+    rows = list(summary['operations'].items()) + [('TOTAL', summary['overall'])]
+    for name, stats in rows:
+        lines.append(
+            f"{name:<16}{stats['requests']:>10}{stats['throughput']:>10.1f}{stats['p50_ms']:>10.1f}"
+            f"{stats['p95_ms']:>10.1f}{stats['p99_ms']:>10.1f}{stats['error_rate']:>8.1%}"
+        )
+    lines.append(f"Elapsed: {summary['elapsed']:.1f}s")
+    return '\n'.join(lines)
+
+class NoRedirectHandler(HTTPRedirectHandler):
+    """Surface redirects as errors; a 302 to /login means the session was lost, not success"""
+
+    def redirect_request(self, req, fp, code, msg, headers, newurl):
+        return None
+
+class VirtualUser:
+    """One simulated browser session with its own cookie jar"""
+
+    def __init__(self, base_url, recorder, email=ADMIN_EMAIL, password=DEFAULT_PASSWORD, timeout=30):
+        self.base_url = base_url.rstrip('/')
+        self.recorder = recorder
+        self.email = email
+        self.password = password
+        self.timeout = timeout
+        self.opener = build_opener(HTTPCookieProcessor(CookieJar()), NoRedirectHandler())
+        self.employees = []
+        self.logged_in = False
+
+    def request(self, operation, method, path, payload=None):
+        data = None if payload is None else json.dumps(payload).encode()
+        req = Request(self.base_url + path, data=data, method=method)
+        if data is not None:
+            req.add_header('Content-Type', 'application/json')
+        start = monotonic()
+        try:
+            with self.opener.open(req, timeout=self.timeout) as response:
+                body = response.read()
+                ok = response.status < 400
+        except HTTPError as e:
+            body = e.read()
+            ok = False
+            if 300 <= e.code < 400 and '/login' in (e.headers.get('Location') or ''):
+                self.logged_in = False
+        except (URLError, OSError) as e:
+            logger.debug(f"{operation} failed: {str(e)}")
+            body = b''
+            ok = False
+        self.recorder.record(operation, monotonic() - start, ok)
+        return ok, body
+
+    def login(self):
+        ok, _ = self.request('login', 'POST', '/login', {'email': self.email, 'password': self.password})
+        self.logged_in = ok
+        return ok
+
+    def list_employees(self):
+        ok, body = self.request('employees', 'GET', '/api/employees')
+        if ok:
+            self.employees = json.loads(body)
+        return ok
+
+    def payslip_burst(self, period, burst_size, batch):
+        """Month-end run: one payslip per employee, posted one by one or as a batch"""
+        if not self.employees:
+            self.list_employees()
+        payslips = [
+            {
+                'employee_id': str(employee['id']),
+                'period': period,
+                'basic_salary': employee.get('basic_pay'),
+                'allowances': employee.get('allowance'),
+                'deductions': employee.get('napsa'),
+                'net_salary': employee.get('net_pay'),
+            }
+            for employee in self.employees[:burst_size]
+        ]
+        if batch:
+            return self.request('payslip_batch', 'POST', '/api/payslips/batch', payslips)[0]
+        return all([self.request('payslip', 'POST', '/api/payslips', payslip)[0] for payslip in payslips])
+
+    def metrics(self):
+        return self.request('metrics', 'GET', '/metrics')[0]
+
+SCENARIOS = {
+    'login': lambda user, run: user.login(),
+    'employees': lambda user, run: user.list_employees(),
+    'payslip_burst': lambda user, run: user.payslip_burst(run.next_period(), run.burst_size, run.batch),
+    'metrics': lambda user, run: user.metrics(),
+}
+
+class LoadRun:
+    """Drive a weighted scenario mix from many virtual users for a fixed duration"""
+
+    def __init__(self, base_url, mix=DEFAULT_MIX, concurrency=10, duration=30.0, burst_size=20,
+                 batch=False, think_time=0.0, report_interval=0.0, seed=None):
+        self.base_url = base_url
+        self.weights = parse_mix(mix)
+        self.concurrency = concurrency
+        self.duration = duration
+        self.burst_size = burst_size
+        self.batch = batch
+        self.think_time = think_time
+        self.report_interval = report_interval
+        self.seed = seed
+        self.recorder = Recorder()
+        self._periods = itertools.count()
+        self._periods_lock = threading.Lock()
+
+    def next_period(self):
+        """Give every burst its own YYYY-MM period so payslips are new rows, not retries"""
+        with self._periods_lock:
+            n = next(self._periods)
+        return f"{2000 + n // 12:04d}-{n % 12 + 1:02d}"
+
+    def _user_loop(self, index, deadline):
+        rng = random.Random(None if self.seed is None else self.seed + index)
+        names = list(self.weights)
+        weights = [self.weights[name] for name in names]
+        user = VirtualUser(self.base_url, self.recorder)
+        while monotonic() < deadline:
+            if not user.logged_in:
+                # First journey, or a failed login / lost session: sign in again
+                user.login()
+            else:
+                SCENARIOS[rng.choices(names, weights)[0]](user, self)
+            if self.think_time:
+                sleep(rng.uniform(0, 2 * self.think_time))
+
+    def run(self):
+        start = monotonic()
+        deadline = start + self.duration
+        threads = [
+            threading.Thread(target=self._user_loop, args=(i, deadline), name=f"vu-{i}", daemon=True)
+            for i in range(self.concurrency)
+        ]
+        for thread in threads:
+            thread.start()
+        if self.report_interval:
+            self._report_progress(start, deadline)
+        for thread in threads:
+            thread.join()
+        return summarize(self.recorder.snapshot(), monotonic() - start)
+
+    def _report_progress(self, start, deadline):
+        # Rolling stats for soak runs, one line per interval
+        self.recorder.take_window()
+        last = monotonic()
+        while monotonic() < deadline:
+            sleep(min(self.report_interval, max(0.0, deadline - monotonic())))
+            now = monotonic()
+            stats = summarize(self.recorder.take_window(), now - last)['overall']
+            last = now
+            print(
+                f"[{monotonic() - start:7.1f}s] {stats['throughput']:8.1f} req/s  "
+                f"p95 {stats['p95_ms']:7.1f} ms  errors {stats['error_rate']:6.1%}",
+                flush=True
+            )
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def wait_for_app(base_url, timeout=30.0):
+    deadline = monotonic() + timeout
+    opener = build_opener()
+    while monotonic() < deadline:
+        try:
+            with opener.open(base_url + '/health', timeout=2):
+                return
+        except (URLError, OSError):
+            sleep(0.2)
+    raise RuntimeError(f"App at {base_url} did not become healthy within {timeout}s")
+
+def start_gunicorn(supabase_url, workers, threads, worker_class, write_behind, verbose=False):
+    port = _free_port()
+    env = dict(os.environ)
+    env.update({
+        'SUPABASE_URL': supabase_url,
+        'SUPABASE_KEY': ANON_KEY,
+        'FLASK_SECRET_KEY': 'load-test-secret-key',
+        'PAYSLIP_WRITE_BEHIND': 'true' if write_behind else 'false',
+    })
+    command = [
+        sys.executable, '-m', 'gunicorn',
+        '--bind', f"127.0.0.1:{port}",
+        '--workers', str(workers),
+        '--threads', str(threads),
+        '--worker-class', worker_class,
+        '--log-level', 'warning',
+        'app:create_app()',
+    ]
+    output = None if verbose else subprocess.DEVNULL
+    process = subprocess.Popen(command, env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+                               stdout=output, stderr=output)
+    return process, f"http://127.0.0.1:{port}"
+
+def main():
+    parser = argparse.ArgumentParser(description='Load and soak test the payroll app against a fake Supabase')
+    parser.add_argument('--target', help='Base URL of an already running app; skips gunicorn')
+    parser.add_argument('--supabase-url', help='Use an already running fake Supabase instead of starting one')
+    parser.add_argument('--workers', type=int, default=2, help='gunicorn worker processes')
+    parser.add_argument('--threads', type=int, default=1, help='gunicorn threads per worker')
+    parser.add_argument('--worker-class', default='sync', help='gunicorn worker class')
+    parser.add_argument('--write-behind', action='store_true', help='Enable the payslip write-behind buffer')
+    parser.add_argument('--concurrency', type=int, default=10, help='Concurrent virtual users')
+    parser.add_argument('--duration', type=float, default=30.0, help='Test duration in seconds')
+    parser.add_argument('--mix', default=DEFAULT_MIX, help=f"Scenario weights (default: {DEFAULT_MIX})")
+    parser.add_argument('--burst-size', type=int, default=20, help='Payslips per month-end burst')
+    parser.add_argument('--batch', action='store_true', help='Post bursts to /api/payslips/batch')
+    parser.add_argument('--think-time', type=float, default=0.0, help='Mean pause between journeys in seconds')
+    parser.add_argument('--report-interval', type=float, default=0.0, help='Print rolling stats every N seconds')
+    parser.add_argument('--latency', type=float, default=0.0, help='Fake Supabase base latency in ms')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Fake Supabase latency jitter in ms')
+    parser.add_argument('--error-rate', type=float, default=0.0, help='Fake Supabase injected error rate')
+    parser.add_argument('--employees', type=int, default=50, help='Employees seeded in the fake Supabase')
+    parser.add_argument('--seed', type=int, default=None, help='Random seed for the scenario mix')
+    parser.add_argument('--json', action='store_true', help='Print the summary as JSON')
+    parser.add_argument('--verbose', action='store_true', help='Show the app and gunicorn logs')
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+    fake = None
+    supabase_url = args.supabase_url
+    if not args.target and not supabase_url:
+        fake = create_server(latency=args.latency, jitter=args.jitter, error_rate=args.error_rate,
+                             employees=args.employees, seed=args.seed)
+        serve_in_thread(fake)
+        supabase_url = fake.url
+
+    process = None
+    base_url = args.target
+    try:
+        if not base_url:
+            process, base_url = start_gunicorn(supabase_url, args.workers, args.threads,
+                                               args.worker_class, args.write_behind, args.verbose)
+        wait_for_app(base_url)
+        run = LoadRun(base_url, args.mix, args.concurrency, args.duration, args.burst_size,
+                      args.batch, args.think_time, args.report_interval, args.seed)
+        summary = run.run()
+    finally:
+        if process:
+            process.terminate()
+            process.wait(timeout=30)
+        if fake:
+            fake.shutdown()
+
+    if fake:
+        summary['supabase'] = {
+            'requests': fake.state.requests,
+            'injected_errors': fake.state.injected_errors,
+            'payslips': len(fake.state.tables['payslips']),
+        }
+    if args.json:
+        print(json.dumps(summary, indent=2))
+    else:
+        print(format_report(summary))
+        if fake:
+            print(f"Supabase requests: {fake.state.requests} "
+                  f"(injected errors: {fake.state.injected_errors}, payslips stored: {summary['supabase']['payslips']})")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,260 @@
+import atexit
+import itertools
+import logging
+import re
+import threading
+from collections import deque
+from time import monotonic, sleep
+
+logger = logging.getLogger(__name__)
+
+PERIOD_PATTERN = re.compile(r'^\d{4}-(0[1-9]|1[0-2])$')
+
+class InvalidPayslip(ValueError):
+    """Raised when a payslip cannot be given a usable idempotency key"""
+
+class BufferFull(RuntimeError):
+    """Raised when the write-behind buffer has no room for another payslip"""
+
+def payslip_idempotency_key(data):
+    """Build the idempotency key for a payslip: employee_id + pay period (YYYY-MM)"""
+    period = data.get('period') or str(data.get('date', ''))[:7]
+    return f"{data.get('employee_id')}:{period}"
+
+def prepare_payslip(data, now):
+    """Validate a payslip and stamp it with its date, period and idempotency key.
+
+    ``period`` comes from the client when given, otherwise it is the month of
+    ``now`` (the time the request was received).
+    """
+    if not isinstance(data, dict):
+        raise InvalidPayslip('Payslip must be an object')
+    employee_id = data.get('employee_id')
+    if employee_id is None or not str(employee_id).strip():
+        raise InvalidPayslip('employee_id is required')
+    row = dict(data)
+    row['employee_id'] = str(employee_id).strip()
+    row.setdefault('date', now)
+    period = row.get('period') or str(row['date'])[:7]
+    if not PERIOD_PATTERN.match(str(period)):
+        raise InvalidPayslip(f"period must be YYYY-MM, got '{period}'")
+    row['period'] = period
+    row['idempotency_key'] = payslip_idempotency_key(row)
+    return row
+
+def dedupe_payslips(rows):
+    """Collapse rows sharing an idempotency key, keeping the first one like the database does"""
+    unique = {}
+    for row in rows:
+        unique.setdefault(row['idempotency_key'], row)
+    return list(unique.values())
+
+# SQLSTATE classes that retrying cannot fix: data exceptions, integrity
+# constraint violations and syntax errors / undefined columns
+PERMANENT_SQLSTATE_CLASSES = ('22', '23', '42')
+
+def is_permanent_error(error):
+    """True for failures caused by the row itself (4xx, constraint or schema errors).
+
+    Anything else, such as timeouts, dropped connections or 5xx responses, is
+    treated as transient and worth retrying.
+    """
+    code = getattr(error, 'code', None)
+    if isinstance(code, int):
+        return 400 <= code < 500
+    if not isinstance(code, str) or not code:
+        return False
+    if code.startswith('PGRST'):
+        # PGRST1xx are request errors and PGRST2xx schema errors; PGRST0xx
+        # are connection errors and PGRST3xx JWT errors
+        return code[5:6] in ('1', '2')
+    return code[:2] in PERMANENT_SQLSTATE_CLASSES
+
+class PayslipWriteBuffer:
+    """In-process write-behind buffer that coalesces payslip inserts.
+
+    A background thread writes pending rows through ``flush_fn`` in batches of
+    up to ``max_batch_size`` once that many rows are pending, when the oldest
+    pending row is older than ``max_delay`` seconds, or when the process shuts
+    down. Rows that fail with a transient error are requeued and retried after
+    a backoff that starts at ``retry_backoff`` and doubles up to ``max_backoff``
+    seconds. If a batch fails
+    permanently its rows are retried one at a time, and rows that still fail
+    permanently are logged and moved to ``dead_letters``.
+    """
+
+    def __init__(self, flush_fn, max_batch_size=50, max_delay=1.0, max_pending=5000, max_dead_letters=1000,
+                 retry_backoff=0.1, max_backoff=30.0):
+        if max_batch_size < 1:
+            raise ValueError(f"max_batch_size must be at least 1, got {max_batch_size}")
+        if max_pending < 1:
+            raise ValueError(f"max_pending must be at least 1, got {max_pending}")
+        if max_delay <= 0:
+            raise ValueError(f"max_delay must be greater than 0, got {max_delay}")
+        self.flush_fn = flush_fn
+        self.max_batch_size = max_batch_size
+        self.max_delay = max_delay
+        self.max_pending = max_pending
+        self.retry_backoff = retry_backoff
+        self.max_backoff = max_backoff
+        self.dead_letters = deque(maxlen=max_dead_letters)
+        self._pending = {}
+        self._in_flight = set()
+        self._oldest = None
+        self._failures = 0
+        self._retry_at = 0.0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name='payslip-write-behind', daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def add(self, row):
+        """Queue a prepared payslip row.
+
+        Returns False when a row with the same idempotency key is already
+        queued or being written; the first row is kept, matching the database.
+        """
+        key = row['idempotency_key']
+        with self._lock:
+            if self._stopped:
+                raise RuntimeError('Payslip write buffer is closed')
+            if key in self._pending or key in self._in_flight:
+                return False
+            # Rows being written count against the cap so requeued rows always fit
+            if len(self._pending) + len(self._in_flight) >= self.max_pending:
+                raise BufferFull(f"Payslip write buffer is full ({self.max_pending} pending)")
+            self._pending[key] = row
+            if self._oldest is None:
+                self._oldest = monotonic()
+        # Never write on the request thread; the background flusher picks it up
+        self._wakeup.set()
+        return True
+
+    def pending(self):
+        with self._lock:
+            return len(self._pending) + len(self._in_flight)
+
+    def flush(self, stop_on_failure=True):
+        """Write the rows pending when called, in batches, and return the number written.
+
+        Rows that fail transiently are requeued for a later flush rather than
+        retried within this call. Unless ``stop_on_failure`` is False, the
+        batches after a transient failure are requeued without being tried.
+        """
+        written = 0
+        with self._flush_lock:
+            with self._lock:
+                rows = list(self._pending.values())
+                self._in_flight.update(self._pending)
+                self._pending = {}
+                self._oldest = None
+            for start in range(0, len(rows), self.max_batch_size):
+                end = start + self.max_batch_size
+                written += self._write(rows[start:end])
+                if stop_on_failure and self._retry_at > monotonic():
+                    # That batch failed transiently; leave the rest for the retry
+                    self._requeue(rows[end:])
+                    break
+        return written
+
+    def _write(self, rows):
+        try:
+            self.flush_fn(rows)
+            logger.info(f"Flushed {len(rows)} buffered payslips")
+            self._finish(rows)
+            return len(rows)
+        except Exception as e:
+            if not is_permanent_error(e):
+                self._requeue(rows, e)
+                return 0
+            logger.error(f"Payslip batch flush error, retrying {len(rows)} rows one at a time: {str(e)}")
+        written = 0
+        for row in rows:
+            try:
+                self.flush_fn([row])
+                self._finish([row])
+                written += 1
+            except Exception as e:
+                if not is_permanent_error(e):
+                    self._requeue([row], e)
+                    continue
+                logger.error(f"Dropping payslip {row['idempotency_key']} after failed write: {str(e)}")
+                self.dead_letters.append({'row': row, 'error': str(e)})
+                self._finish([row], succeeded=False)
+        return written
+
+    def _finish(self, rows, succeeded=True):
+        with self._lock:
+            for row in rows:
+                self._in_flight.discard(row['idempotency_key'])
+            if succeeded:
+                self._failures = 0
+                self._retry_at = 0.0
+
+    def _requeue(self, rows, error=None):
+        """Put rows back in the queue; a transient ``error`` also extends the backoff"""
+        if not rows:
+            return
+        with self._lock:
+            if error is not None:
+                self._failures += 1
+                backoff = min(self.max_backoff, self.retry_backoff * 2 ** (self._failures - 1))
+                self._retry_at = monotonic() + backoff
+            for row in rows:
+                key = row['idempotency_key']
+                self._in_flight.discard(key)
+                self._pending[key] = row
+            if self._oldest is None:
+                self._oldest = monotonic()
+        if error is not None:
+            logger.warning(f"Payslip flush failed, requeued {len(rows)} rows, retrying in {backoff:.1f}s: {str(error)}")
+
+    def close(self, timeout=10.0):
+        """Stop the background flusher and write out anything still pending.
+
+        Every pending batch is tried on each pass, and passes are repeated with
+        short pauses for up to ``timeout`` seconds; whatever is still pending
+        after that is logged as lost.
+        """
+        with self._lock:
+            if self._stopped:
+                return
+            self._stopped = True
+        self._wakeup.set()
+        self._thread.join(timeout=self.max_delay + 5)
+        deadline = monotonic() + timeout
+        for attempt in itertools.count():
+            self.flush(stop_on_failure=False)
+            remaining = deadline - monotonic()
+            if not self.pending() or remaining <= 0:
+                break
+            sleep(min(self.retry_backoff * 2 ** attempt, 1.0, remaining))
+        if self.pending():
+            logger.error(f"Dropping {self.pending()} payslips on shutdown after retrying for {timeout:.0f}s")
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if self._stopped:
+                    return
+                oldest = self._oldest
+                full = len(self._pending) >= self.max_batch_size
+                retry_in = self._retry_at - monotonic()
+            if oldest is None:
+                self._wakeup.wait()
+                self._wakeup.clear()
+                continue
+            if retry_in > 0:
+                # Back off after a transient failure, even if the buffer is full
+                self._wakeup.wait(retry_in)
+                self._wakeup.clear()
+                continue
+            remaining = self.max_delay - (monotonic() - oldest)
+            if remaining > 0 and not full:
+                self._wakeup.wait(remaining)
+                self._wakeup.clear()
+                continue
+            self.flush()
@@ -201,10 +201,26 @@ function calculateSalary() {
 // Function to save payslip
 async function savePayslip(payslipData) {
     try {
-        await API.createPayslip(payslipData);
+        const result = await API.createPayslip(payslipData);
+        if (result.error) {
+            alert(`The payslip was not saved: ${result.error}`);
+            return;
+        }
+        // Only the first payslip per employee and month is kept
+        if (result.duplicate || result.status === 'duplicate') {
+            alert(`A payslip for ${payslipData.employeeName} for ${payslipData.period} was already saved. ` +
+                'The saved payslip was kept and this one was not stored.');
+        }
+        if (result.status === 'queued') {
+            // Write-behind mode: the payslip is stored shortly, so refresh the list afterwards
+            alert('The payslip was accepted and will appear in the saved list shortly.');
+            setTimeout(displaySavedPayslips, 3000);
+            return;
+        }
         await displaySavedPayslips();
     } catch (error) {
         console.error('Error saving payslip:', error);
+        alert('There was an error saving the payslip. Please try again.');
     }
 }
 
@@ -413,8 +429,11 @@ function generatePayslip() {
             }
         }, 100);
 
-        // Save and show the payslip
+        // Save and show the payslip; the server keys it on employee_id + period (YYYY-MM)
+        const payMonth = new Date();
         savePayslip({
+            employee_id: employeeId,
+            period: `${payMonth.getFullYear()}-${String(payMonth.getMonth() + 1).padStart(2, '0')}`,
             employeeId,
             employeeName,
             position,
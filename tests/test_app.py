@@ -135,3 +135,94 @@ def test_payslips_post(client):
     assert response.status_code == 200
     json_data = response.get_json()
     assert 'id' in json_data
+
+def test_payslips_post_idempotency_key(client):
+    """Test that a payslip is keyed by employee and period."""
+    with client.session_transaction() as sess:
+        sess['user'] = {'id': 'test-id', 'email': 'test@test.com', 'role': 'viewer'}
+    response = client.post('/api/payslips', json={
+        'employee_id': 'test-employee-id',
+        'period': '2026-10',
+        'amount': 1000
+    })
+    assert response.status_code == 200
+    assert response.get_json()['idempotency_key'] == 'test-employee-id:2026-10'
+
+def test_payslips_batch_post(client):
+    """Test creating payslips in a batch, collapsing retried duplicates."""
+    with client.session_transaction() as sess:
+        sess['user'] = {'id': 'test-id', 'email': 'test@test.com', 'role': 'viewer'}
+    response = client.post('/api/payslips/batch', json=[
+        {'employee_id': 'emp-1', 'period': '2026-10', 'amount': 1000},
+        {'employee_id': 'emp-2', 'period': '2026-10', 'amount': 2000},
+        {'employee_id': 'emp-1', 'period': '2026-10', 'amount': 1000}
+    ])
+    assert response.status_code == 200
+    json_data = response.get_json()
+    assert len(json_data) == 2
+    assert all('id' in payslip for payslip in json_data)
+
+def test_payslips_batch_post_requires_list(client):
+    """Test that the batch endpoint rejects a single payslip."""
+    with client.session_transaction() as sess:
+        sess['user'] = {'id': 'test-id', 'email': 'test@test.com', 'role': 'viewer'}
+    response = client.post('/api/payslips/batch', json={'employee_id': 'emp-1'})
+    assert response.status_code == 400
+
+def test_payslips_post_write_behind():
+    """Test that write-behind mode queues payslips and flushes them in one batch."""
+    app = create_app({
+        'TESTING': True,
+        'SECRET_KEY': 'test-secret-key',
+        'PAYSLIP_WRITE_BEHIND': True,
+        'PAYSLIP_BATCH_SIZE': 10,
+        'PAYSLIP_FLUSH_INTERVAL': 60,
+    })
+    client = app.test_client()
+    with client.session_transaction() as sess:
+        sess['user'] = {'id': 'test-id', 'email': 'test@test.com', 'role': 'viewer'}
+    for employee_id, status in (('emp-1', 'queued'), ('emp-2', 'queued'), ('emp-1', 'duplicate')):
+        response = client.post('/api/payslips', json={'employee_id': employee_id, 'period': '2026-10'})
+        assert response.status_code == 202
+        assert response.get_json()['status'] == status
+    assert app.payslip_buffer.pending() == 2
+    assert app.payslip_buffer.flush() == 2
+    app.payslip_buffer.close()
+
+def test_payslips_post_requires_employee_id(client):
+    """Test that a payslip without employee_id is rejected instead of sharing a key."""
+    with client.session_transaction() as sess:
+        sess['user'] = {'id': 'test-id', 'email': 'test@test.com', 'role': 'viewer'}
+    response = client.post('/api/payslips', json={'employeeId': 'EMP-A', 'period': '2026-10'})
+    assert response.status_code == 400
+    assert 'employee_id' in response.get_json()['error']
+
+def test_payslips_post_rejects_bad_period(client):
+    """Test that the period must be YYYY-MM."""
+    with client.session_transaction() as sess:
+        sess['user'] = {'id': 'test-id', 'email': 'test@test.com', 'role': 'viewer'}
+    response = client.post('/api/payslips', json={'employee_id': 'emp-1', 'period': 'October'})
+    assert response.status_code == 400
+
+def test_payslips_batch_post_rejects_invalid_items(client):
+    """Test that the batch endpoint rejects items that are not valid payslips."""
+    with client.session_transaction() as sess:
+        sess['user'] = {'id': 'test-id', 'email': 'test@test.com', 'role': 'viewer'}
+    response = client.post('/api/payslips/batch', json=[1, 2])
+    assert response.status_code == 400
+    response = client.post('/api/payslips/batch', json=[
+        {'employee_id': 'emp-1', 'period': '2026-10'},
+        {'employeeId': 'emp-2', 'period': '2026-10'}
+    ])
+    assert response.status_code == 400
+    assert 'Payslip 1' in response.get_json()['error']
+
+def test_payslips_write_behind_rejects_invalid_settings():
+    """Test that a zero batch size is rejected instead of spinning the flusher."""
+    with pytest.raises(ValueError):
+        create_app({
+            'TESTING': True,
+            'SECRET_KEY': 'test-secret-key',
+            'PAYSLIP_WRITE_BEHIND': True,
+            'PAYSLIP_BATCH_SIZE': 0,
+        })
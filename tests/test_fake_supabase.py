@@ -0,0 +1,213 @@
+import json
+import pytest
+from urllib.request import Request, urlopen
+from urllib.error import HTTPError
+from fake_supabase import ANON_KEY, DEFAULT_PASSWORD, FakeSupabase, PostgrestError, create_server, serve_in_thread, parse_query
+from app import create_app
+from load_test import LatencyStats, Recorder, parse_mix, summarize
+
+@pytest.fixture
+def fake():
+    """Start a seeded fake Supabase server for each test."""
+    server = create_server(employees=5, seed=1)
+    serve_in_thread(server)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def call(fake, method, path, payload=None, headers=None):
+    data = None if payload is None else json.dumps(payload).encode()
+    req = Request(fake.url + path, data=data, method=method, headers={'apikey': ANON_KEY, **(headers or {})})
+    if data is not None:
+        req.add_header('Content-Type', 'application/json')
+    with urlopen(req) as response:
+        body = response.read()
+        return response.status, dict(response.headers), json.loads(body) if body else None
+
+def test_parse_query():
+    """Test that filters and modifiers are split out of a PostgREST query."""
+    filters, options = parse_query('select=*&id=eq.3&key=in.(a,"b:c")&order=date.desc&limit=5')
+    assert filters == [('id', 'eq', '3'), ('key', 'in', ['a', 'b:c'])]
+    assert options['order'] == [('date', True)]
+    assert options['limit'] == '5'
+
+def test_password_login(fake):
+    """Test signing in with a seeded account."""
+    status, _, data = call(fake, 'POST', '/auth/v1/token?grant_type=password', {
+        'email': 'admin@riverdale.test',
+        'password': DEFAULT_PASSWORD
+    })
+    assert status == 200
+    assert data['access_token'] and data['user']['email'] == 'admin@riverdale.test'
+    with pytest.raises(HTTPError) as error:
+        call(fake, 'POST', '/auth/v1/token?grant_type=password', {
+            'email': 'admin@riverdale.test',
+            'password': 'wrong'
+        })
+    assert error.value.code == 400
+
+def test_select_with_count(fake):
+    """Test filtering, ordering, limiting and exact counts."""
+    status, headers, data = call(fake, 'GET', '/rest/v1/employees?select=id,name&order=id.desc&limit=2',
+                                 headers={'Prefer': 'count=exact'})
+    assert status == 200
+    assert [row['id'] for row in data] == [5, 4]
+    assert headers['Content-Range'] == '0-1/5'
+    _, _, data = call(fake, 'GET', '/rest/v1/employees?select=*&id=eq.2')
+    assert data[0]['name'] == 'Employee 2'
+
+def test_upsert_ignores_duplicate_keys(fake):
+    """Test that upserts on idempotency_key skip rows that already exist."""
+    rows = [{'employee_id': '1', 'period': '2026-10', 'idempotency_key': '1:2026-10'}]
+    headers = {'Prefer': 'return=representation,resolution=ignore-duplicates'}
+    path = '/rest/v1/payslips?on_conflict=idempotency_key'
+    assert len(call(fake, 'POST', path, rows, headers)[2]) == 1
+    assert call(fake, 'POST', path, rows, headers)[2] == []
+    assert len(fake.state.tables['payslips']) == 1
+    with pytest.raises(HTTPError) as error:
+        call(fake, 'POST', '/rest/v1/payslips', rows, {'Prefer': 'return=representation'})
+    assert error.value.code == 409
+
+def test_unique_indexes_follow_updates_and_deletes():
+    """Test that conflict checks and key lookups stay correct as rows change."""
+    state = FakeSupabase()
+    state.insert('payslips', [{'employee_id': '1', 'idempotency_key': 'a'}, {'employee_id': '2', 'idempotency_key': 'b'}])
+    with pytest.raises(PostgrestError):
+        state.insert('payslips', [{'employee_id': '3', 'idempotency_key': 'a'}])
+    with pytest.raises(PostgrestError):
+        state.update('payslips', {'idempotency_key': 'b'}, [('idempotency_key', 'eq', 'a')])
+    state.update('payslips', {'idempotency_key': 'c'}, [('idempotency_key', 'eq', 'a')])
+    assert state.select('payslips', [('idempotency_key', 'eq', 'a')])[0] == []
+    assert state.select('payslips', [('idempotency_key', 'in', ['c', 'b'])])[1] == 2
+    state.delete('payslips', [('idempotency_key', 'eq', 'c')])
+    assert state.insert('payslips', [{'employee_id': '3', 'idempotency_key': 'c'}])
+    assert state.count('payslips') == 2
+    assert state.count('payslips', [('employee_id', 'eq', '3')]) == 1
+
+def test_ordered_limit_matches_full_sort():
+    """Test that the top-k path orders NULLs like a full sort."""
+    state = FakeSupabase()
+    state.insert('payslips', [
+        {'employee_id': str(i), 'idempotency_key': str(i), 'net_salary': salary}
+        for i, salary in enumerate([5, None, 7, 1, None, 3])
+    ])
+    for descending in (True, False):
+        full, _ = state.select('payslips', order=[('net_salary', descending)])
+        top, _ = state.select('payslips', order=[('net_salary', descending)], limit=3)
+        assert top == full[:3]
+
+def test_unsupported_filters_are_rejected(fake):
+    """Test that filters the fake cannot evaluate fail instead of matching every row."""
+    with pytest.raises(HTTPError) as error:
+        call(fake, 'GET', '/rest/v1/employees?select=*&name=like.Employee*')
+    assert error.value.code == 400
+
+def test_unknown_columns_are_rejected(fake):
+    """Test that columns missing from database.sql are rejected like PostgREST does."""
+    with pytest.raises(HTTPError) as error:
+        call(fake, 'POST', '/rest/v1/payslips', [{'employeeId': 'EMP-A'}], {'Prefer': 'return=representation'})
+    assert error.value.code == 400
+    assert json.loads(error.value.read())['code'] == 'PGRST204'
+    with pytest.raises(HTTPError) as error:
+        call(fake, 'PATCH', '/rest/v1/employees?id=eq.1', {'nickname': 'X'})
+    assert error.value.code == 400
+    with pytest.raises(HTTPError) as error:
+        call(fake, 'GET', '/rest/v1/employees?select=nickname')
+    assert error.value.code == 400
+    assert len(fake.state.tables['payslips']) == 0
+
+def test_app_against_fake(fake, monkeypatch):
+    """Test the app's real Supabase client against the fake server."""
+    monkeypatch.setenv('SUPABASE_URL', fake.url)
+    monkeypatch.setenv('SUPABASE_KEY', ANON_KEY)
+    client = create_app().test_client()
+
+    response = client.post('/login', json={'email': 'admin@riverdale.test', 'password': DEFAULT_PASSWORD})
+    assert response.status_code == 200
+    with client.session_transaction() as sess:
+        assert sess['user']['role'] == 'admin'
+
+    response = client.get('/api/employees')
+    assert response.status_code == 200
+    assert len(response.get_json()) == 5
+
+    payslips = [{'employee_id': str(i), 'period': '2026-10', 'net_salary': 1000} for i in (1, 2)]
+    response = client.post('/api/payslips/batch', json=payslips)
+    assert response.status_code == 200
+    assert [payslip['duplicate'] for payslip in response.get_json()] == [False, False]
+    response = client.post('/api/payslips/batch', json=payslips)
+    assert [payslip['duplicate'] for payslip in response.get_json()] == [True, True]
+    assert len(fake.state.tables['payslips']) == 2
+
+    response = client.get('/metrics')
+    assert response.status_code == 200
+    json_data = response.get_json()
+    assert json_data['counts']['employees'] == 5
+    assert json_data['counts']['payslips'] == 2
+    assert len(json_data['recent_activity']['payslips']) == 2
+
+    response = client.post('/update-password', json={'new_password': 'changed'})
+    assert response.status_code == 200
+    assert fake.state.accounts['admin@riverdale.test']['password'] == 'changed'
+
+def test_app_reports_unreadable_payslips(fake, monkeypatch):
+    """Test that a payslip which is neither written nor readable returns 409 naming its key."""
+    monkeypatch.setenv('SUPABASE_URL', fake.url)
+    monkeypatch.setenv('SUPABASE_KEY', ANON_KEY)
+    client = create_app().test_client()
+    client.post('/login', json={'email': 'admin@riverdale.test', 'password': DEFAULT_PASSWORD})
+    client.post('/api/payslips', json={'employee_id': '1', 'period': '2026-10'})
+    # Simulate the stored row being hidden from the caller, e.g. by RLS
+    monkeypatch.setattr(fake.state, 'select', lambda *args, **kwargs: ([], 0))
+
+    response = client.post('/api/payslips', json={'employee_id': '1', 'period': '2026-10'})
+    assert response.status_code == 409
+    assert response.get_json()['idempotency_key'] == '1:2026-10'
+    response = client.post('/api/payslips/batch', json=[{'employee_id': '1', 'period': '2026-10'}])
+    assert response.status_code == 409
+    assert response.get_json()['idempotency_keys'] == ['1:2026-10']
+
+def test_error_injection():
+    """Test that every request fails when the error rate is 1."""
+    server = create_server(employees=0, error_rate=1.0)
+    serve_in_thread(server)
+    try:
+        with pytest.raises(HTTPError) as error:
+            call(server, 'GET', '/rest/v1/employees?select=*')
+        assert error.value.code == 503
+        assert server.state.injected_errors == 1
+    finally:
+        server.shutdown()
+        server.server_close()
+
+def test_latency_stats_and_summary():
+    """Test the load report statistics."""
+    stats = LatencyStats()
+    for ms in range(1, 101):
+        stats.add(ms / 1000.0, True)
+    assert stats.percentile(95) * 1000 == pytest.approx(95, rel=0.011)
+    assert LatencyStats().percentile(50) == 0.0
+    recorder = Recorder()
+    recorder.record('employees', 0.1, True)
+    recorder.record('employees', 0.3, False)
+    recorder.record('metrics', 0.2, True)
+    summary = summarize(recorder.snapshot(), 2.0)
+    assert summary['overall']['requests'] == 3
+    assert summary['overall']['throughput'] == 1.5
+    assert summary['operations']['employees']['error_rate'] == 0.5
+
+def test_recorder_window_only_holds_new_samples():
+    """Test that progress windows are reset each interval while totals keep counting."""
+    recorder = Recorder()
+    recorder.record('employees', 0.1, True)
+    assert recorder.take_window()['employees'].requests == 1
+    recorder.record('employees', 0.1, True)
+    assert recorder.take_window()['employees'].requests == 1
+    assert recorder.take_window() == {}
+    assert recorder.snapshot()['employees'].requests == 2
+
+def test_parse_mix_rejects_unknown_scenario():
+    """Test that the scenario mix only accepts known journeys."""
+    assert parse_mix('login=1,metrics=2') == {'login': 1.0, 'metrics': 2.0}
+    with pytest.raises(ValueError):
+        parse_mix('checkout=1')
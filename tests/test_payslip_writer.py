@@ -0,0 +1,202 @@
+import threading
+import pytest
+from payslip_writer import (
+    BufferFull, InvalidPayslip, PayslipWriteBuffer, dedupe_payslips, is_permanent_error, prepare_payslip,
+    payslip_idempotency_key
+)
+
+class DatabaseError(Exception):
+    """Stand-in for postgrest's APIError, which carries the PostgREST or SQLSTATE code"""
+    def __init__(self, code):
+        super().__init__(f"Error {code}")
+        self.code = code
+
+def make_row(employee_id, period='2026-10', **fields):
+    return prepare_payslip(dict(fields, employee_id=employee_id, period=period), '2026-10-31T00:00:00+00:00')
+
+def test_idempotency_key_defaults_to_date_period():
+    """Test that the period falls back to the payslip's month."""
+    row = prepare_payslip({'employee_id': 'emp-1'}, '2026-10-31T12:00:00+00:00')
+    assert row['period'] == '2026-10'
+    assert row['idempotency_key'] == 'emp-1:2026-10'
+    assert payslip_idempotency_key(row) == 'emp-1:2026-10'
+
+def test_client_period_is_kept():
+    """Test that payroll run on the 1st can key the slip to the previous month."""
+    row = prepare_payslip({'employee_id': 'emp-1', 'period': '2026-09'}, '2026-10-01T08:00:00+00:00')
+    assert row['idempotency_key'] == 'emp-1:2026-09'
+
+@pytest.mark.parametrize('data', [
+    {'employeeId': 'EMP-A'},
+    {'employee_id': ''},
+    {'employee_id': '  '},
+    {'employee_id': 'emp-1', 'period': '2026-13'},
+    [1, 2],
+    None,
+])
+def test_invalid_payslips_are_rejected(data):
+    """Test that payslips without a usable key are rejected."""
+    with pytest.raises(InvalidPayslip):
+        prepare_payslip(data, '2026-10-31T00:00:00+00:00')
+
+def test_dedupe_keeps_first_row():
+    """Test that duplicates keep the first row, as the database does."""
+    rows = dedupe_payslips([make_row('emp-1', net_salary=100), make_row('emp-1', net_salary=200)])
+    assert [row['net_salary'] for row in rows] == [100]
+
+def test_flush_on_size():
+    """Test that reaching the batch size flushes a single multi-row write in the background."""
+    batches = []
+    flushed = threading.Event()
+    def write(rows):
+        batches.append(rows)
+        flushed.set()
+    buffer = PayslipWriteBuffer(write, max_batch_size=3, max_delay=60)
+    for employee_id in ('emp-1', 'emp-2', 'emp-3'):
+        buffer.add(make_row(employee_id))
+    assert flushed.wait(2)
+    assert [len(batch) for batch in batches] == [3]
+    buffer.close()
+
+def test_add_never_writes_on_caller_thread():
+    """Test that filling the buffer does not run the write on the request thread."""
+    caller = threading.get_ident()
+    writers = []
+    done = threading.Event()
+    def write(rows):
+        writers.append(threading.get_ident())
+        done.set()
+    buffer = PayslipWriteBuffer(write, max_batch_size=1, max_delay=60)
+    assert buffer.add(make_row('emp-1')) is True
+    assert done.wait(2)
+    assert caller not in writers
+    buffer.close()
+
+def test_retries_are_coalesced():
+    """Test that re-queueing the same idempotency key keeps the first row."""
+    batches = []
+    buffer = PayslipWriteBuffer(batches.append, max_batch_size=10, max_delay=60)
+    assert buffer.add(make_row('emp-1', net_salary=100)) is True
+    assert buffer.add(make_row('emp-1', net_salary=200)) is False
+    assert buffer.pending() == 1
+    buffer.close()
+    assert [[row['net_salary'] for row in batch] for batch in batches] == [[100]]
+
+def test_flush_on_time():
+    """Test that pending rows are flushed once the delay elapses."""
+    flushed = threading.Event()
+    buffer = PayslipWriteBuffer(lambda rows: flushed.set(), max_batch_size=10, max_delay=0.05)
+    buffer.add(make_row('emp-1'))
+    assert flushed.wait(2)
+    buffer.close()
+
+def test_bad_row_does_not_block_others():
+    """Test that a row that always fails is dead-lettered while the rest are written."""
+    written = []
+    def write(rows):
+        if any(row['employee_id'] == 'bad' for row in rows):
+            raise DatabaseError('23503')
+        written.extend(row['employee_id'] for row in rows)
+    buffer = PayslipWriteBuffer(write, max_batch_size=10, max_delay=60)
+    for employee_id in ('emp-1', 'bad', 'emp-2'):
+        buffer.add(make_row(employee_id))
+    assert buffer.flush() == 2
+    assert written == ['emp-1', 'emp-2']
+    assert buffer.pending() == 0
+    assert [letter['row']['employee_id'] for letter in buffer.dead_letters] == ['bad']
+    buffer.add(make_row('emp-3'))
+    assert buffer.flush() == 1
+    buffer.close()
+
+@pytest.mark.parametrize('error, permanent', [
+    (DatabaseError('23503'), True),
+    (DatabaseError('PGRST204'), True),
+    (DatabaseError(422), True),
+    (DatabaseError('PGRST000'), False),
+    (DatabaseError(503), False),
+    (DatabaseError('57014'), False),
+    (TimeoutError('timed out'), False),
+    (ConnectionError('connection reset'), False),
+])
+def test_error_classification(error, permanent):
+    """Test that only errors caused by the row itself are treated as permanent."""
+    assert is_permanent_error(error) is permanent
+
+def test_transient_failure_is_retried():
+    """Test that a row whose write fails once with a transient error is written on retry."""
+    attempts = []
+    written = threading.Event()
+    def write(rows):
+        attempts.append([row['employee_id'] for row in rows])
+        if len(attempts) == 1:
+            raise DatabaseError('PGRST000')
+        written.set()
+    buffer = PayslipWriteBuffer(write, max_batch_size=10, max_delay=0.05)
+    buffer.add(make_row('emp-1'))
+    assert written.wait(2)
+    assert attempts == [['emp-1'], ['emp-1']]
+    assert buffer.pending() == 0
+    assert not buffer.dead_letters
+    buffer.close()
+
+def test_transient_failure_keeps_rows_queued():
+    """Test that rows stay queued, not dead-lettered, while the database is unavailable."""
+    def write(rows):
+        raise ConnectionError('connection refused')
+    buffer = PayslipWriteBuffer(write, max_batch_size=1, max_delay=60, max_pending=2)
+    buffer.add(make_row('emp-1'))
+    buffer.add(make_row('emp-2'))
+    assert buffer.flush() == 0
+    assert buffer.pending() == 2
+    assert not buffer.dead_letters
+    with pytest.raises(BufferFull):
+        buffer.add(make_row('emp-3'))
+    assert buffer.add(make_row('emp-1')) is False
+    buffer.flush_fn = lambda rows: None
+    buffer.close()
+    assert buffer.pending() == 0
+
+@pytest.mark.parametrize('settings', [
+    {'max_batch_size': 0},
+    {'max_pending': 0},
+    {'max_delay': 0},
+])
+def test_invalid_settings_are_rejected(settings):
+    """Test that settings which would stall the flusher are rejected."""
+    with pytest.raises(ValueError):
+        PayslipWriteBuffer(lambda rows: None, **settings)
+
+def test_pending_is_capped():
+    """Test that the buffer refuses rows once it is full."""
+    buffer = PayslipWriteBuffer(lambda rows: None, max_batch_size=10, max_delay=60, max_pending=2)
+    buffer.add(make_row('emp-1'))
+    buffer.add(make_row('emp-2'))
+    with pytest.raises(BufferFull):
+        buffer.add(make_row('emp-3'))
+    buffer.close()
+
+def test_close_flushes_and_rejects_new_rows():
+    """Test that closing the buffer writes pending rows and refuses new ones."""
+    batches = []
+    buffer = PayslipWriteBuffer(batches.append, max_batch_size=10, max_delay=60)
+    buffer.add(make_row('emp-1'))
+    buffer.close()
+    assert len(batches) == 1
+    with pytest.raises(RuntimeError):
+        buffer.add(make_row('emp-2'))
+
+def test_close_retries_every_batch_through_intermittent_failures():
+    """Test that shutdown keeps writing later batches when earlier ones fail transiently."""
+    calls = []
+    written = []
+    def write(rows):
+        calls.append(len(rows))
+        if len(calls) % 2:
+            raise DatabaseError('PGRST000')
+        written.extend(row['employee_id'] for row in rows)
+    buffer = PayslipWriteBuffer(write, max_batch_size=2, max_delay=60)
+    for i in range(10):
+        buffer.add(make_row(f"emp-{i}"))
+    buffer.close(timeout=5)
+    assert sorted(written) == sorted(f"emp-{i}" for i in range(10))
+    assert buffer.pending() == 0